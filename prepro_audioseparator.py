@@ -6,10 +6,35 @@ Date: 11.11.2024
 
 import os
 import sys
-import subprocess
-import librosa
+from functools import lru_cache
+
 import pandas as pd
 
+MODEL_FILENAME = "UVR-MDX-NET-Inst_HQ_3.onnx"
+MODEL_STEM = os.path.splitext(MODEL_FILENAME)[0]
+
+
+@lru_cache(maxsize=None)
+def _get_separator(output_dir):
+    """Create a separator with the model loaded, once per output directory.
+    
+    Loading the ONNX model (and its CUDA context) is the expensive part of
+    separation, so the separator is kept for the lifetime of the process.
+    
+    Args:
+        output_dir (str): Directory for separated audio files
+        
+    Returns:
+        Separator: Separator ready to process files
+    """
+    # Imported here so that importing the package does not load the
+    # separation stack (onnxruntime, torch)
+    from audio_separator.separator import Separator
+
+    separator = Separator(output_dir=output_dir, output_format="FLAC")
+    separator.load_model(model_filename=MODEL_FILENAME)
+    return separator
+
 
 def separate_audio(input_file, output_dir):
     """Separate audio using audio-separator.
@@ -39,38 +64,19 @@ def separate_audio(input_file, output_dir):
         # Ensure output directory exists
         os.makedirs(output_dir, exist_ok=True)
         
-        # Build the command
-        cmd = [
-            "audio-separator",
-            input_file,
-            "--model_filename", "UVR-MDX-NET-Inst_HQ_3.onnx",
-            "--output_dir", output_dir,
-            "--output_format", "flac"
-        ]
-        
-        print(f"Running command: {' '.join(cmd)}")
-        
-        # Execute command
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            env=os.environ.copy()
-        )
-        
-        if result.returncode != 0:
-            print(f"Error output: {result.stderr}")
-            print(f"Standard output: {result.stdout}")
-            raise Exception("audio-separator command failed")
+        # Separate with the cached model of this process
+        print(f"Separating with model: {MODEL_FILENAME}")
+        separator = _get_separator(output_dir)
+        separator.separate(input_file)
             
         # Define output file paths
         vocals_file = os.path.join(
             output_dir,
-            f"{base_name}_(Vocals)_UVR-MDX-NET-Inst_HQ_3.flac"
+            f"{base_name}_(Vocals)_{MODEL_STEM}.flac"
         )
         instrumental_file = os.path.join(
             output_dir,
-            f"{base_name}_(Instrumental)_UVR-MDX-NET-Inst_HQ_3.flac"
+            f"{base_name}_(Instrumental)_{MODEL_STEM}.flac"
         )
         
         # Verify files were created
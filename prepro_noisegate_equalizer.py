@@ -4,17 +4,20 @@ Author: Valerie Hofmann
 Date: 15.11.2024
 """
 
+from functools import lru_cache
+
 import numpy as np
 import librosa
 import soundfile as sf
 import scipy.signal as signal
-import copy
-from numpy import (array, argmin, argmax, arange, floor, mod, zeros,
+from scipy.fft import rfft, set_workers
+from numba import njit
+from numpy import (argmin, argmax, arange, floor, mod, zeros,
                   median, log10, int16)
 
 
 def dynamic_noise_reduction(audio, sr, chunk_duration=0.025,
-                          overlap_ratio=0.5, threshold_ratio=2.0):
+                          overlap_ratio=0.5, threshold_ratio=2.0, workers=-1):
     """Apply dynamic noise reduction based on RMS energy and spectral analysis.
 
     Parameters:
@@ -28,65 +31,181 @@ def dynamic_noise_reduction(audio, sr, chunk_duration=0.025,
             Overlap between windows (0-1)
         threshold_ratio: float
             How many times above median RMS to set threshold
+        workers: int
+            Threads for the batched FFT, -1 to use all cores
             
     Returns:
         np.array: Processed audio with noise reduction applied
     """
+    audio = np.asarray(audio, dtype=np.float32)
+
     # Calculate chunk sizes
     chunk_size = int(chunk_duration * sr)
     hop_size = int(chunk_size * (1 - overlap_ratio))
 
-    # Frame the signal
+    # Frame the signal, one chunk per column
     frames = librosa.util.frame(audio, frame_length=chunk_size,
                                hop_length=hop_size)
+    n_freq = chunk_size // 2 + 1
+
+    # Calculate RMS for each chunk
+    chunk_rms = np.sqrt(np.einsum('ij,ij->j', frames, frames) / chunk_size)
+
+    # Detrend and window all chunks at once for the periodogram; this
+    # matches signal.periodogram(chunk, fs=sr, window=('kaiser', 38))
+    win = _kaiser(chunk_size, 38)
+    scale = 2.0 / (sr * np.dot(win, win))
+    windowed = frames - frames.mean(axis=0, keepdims=True)
+    windowed *= win[:, None]
+
+    # No periodogram bin can exceed (sum |windowed|)**2 * scale, and so
+    # neither can the noise median. Chunks louder than the threshold for
+    # that bound keep gain 1 without any spectral analysis
+    bound = threshold_ratio * np.abs(windowed).sum(axis=0) * np.sqrt(scale)
+    quiet = np.flatnonzero(~(chunk_rms > bound))
+    gains = np.ones(frames.shape[1], dtype=np.float32)
+
+    if quiet.size:
+        # Calculate spectral features of the remaining chunks
+        with set_workers(workers):
+            spectrum = rfft(windowed[:, quiet], axis=0)
+        ps = (spectrum.real**2 + spectrum.imag**2) * scale
+        ps[0] *= 0.5
+        if chunk_size % 2 == 0:
+            ps[-1] *= 0.5
+
+        # Find fundamental frequency and the bins of its peak
+        fund_bins = np.argmax(ps, axis=0)
+        lo, hi = _peak_bounds(ps, fund_bins)
+        bins = arange(n_freq)[:, None]
+        fund_mask = (bins >= lo) & (bins <= hi)
+
+        # Calculate noise profile as the median of the remaining non-zero
+        # bins; excluded bins are sorted to the end of each column
+        excluded = fund_mask | (ps == 0)
+        noise_prepared = np.where(excluded, np.inf, ps)
+        noise_prepared.sort(axis=0)
+        n_noise = n_freq - excluded.sum(axis=0)
+        mid = np.stack([(n_noise - 1) // 2, n_noise // 2]).clip(0)
+        noise_mean = np.take_along_axis(noise_prepared, mid,
+                                        axis=0).mean(axis=0)
+        noise_mean[n_noise == 0] = np.nan
 
-    # Initialize output
-    processed_audio = np.zeros_like(audio)
-    gain_envelope = np.zeros_like(audio)
+        # Dynamic threshold based on noise floor
+        noise_floor = np.sqrt(noise_mean)
+        threshold = noise_floor * threshold_ratio
 
-    for i in range(frames.shape[1]):
-        chunk = frames[:, i]
+        # Calculate gain
+        rms = chunk_rms[quiet]
+        gains[quiet] = np.where(rms > threshold, 1.0, (rms / threshold) ** 2)
+
+    # Apply gain and window in a single buffer, padded to whole hops so
+    # that segment j of chunk i lands on output block i + j
+    han = _hann(chunk_size)
+    n_frames = frames.shape[1]
+    n_segments = -(-chunk_size // hop_size)
+    processed_chunks = np.zeros((n_frames, n_segments * hop_size),
+                                dtype=np.float32)
+    np.multiply(frames.T, han, out=processed_chunks[:, :chunk_size])
+    processed_chunks[:, :chunk_size] *= gains[:, None]
+    segments = processed_chunks.reshape(n_frames, n_segments, hop_size)
+    han_segments = np.zeros(n_segments * hop_size, dtype=np.float32)
+    han_segments[:chunk_size] = han
+    han_segments = han_segments.reshape(n_segments, hop_size)
+
+    # Add to output with overlap-add
+    blocks = np.zeros((2, n_frames + n_segments - 1, hop_size),
+                      dtype=np.float32)
+    for j in range(n_segments):
+        blocks[0, j:j + n_frames] += segments[:, j]
+        blocks[1, j:j + n_frames] += han_segments[j]
+
+    processed_audio = np.zeros_like(audio, dtype=np.float32)
+    gain_envelope = np.zeros_like(audio, dtype=np.float32)
+    n = min(len(audio), blocks[0].size)
+    processed_audio[:n] = blocks[0].ravel()[:n]
+    gain_envelope[:n] = blocks[1].ravel()[:n]
 
-        # Calculate spectral features
-        faxis, ps = signal.periodogram(chunk, fs=sr, window=('kaiser', 38))
+    # Normalize for overlap-add
+    np.maximum(gain_envelope, 1e-8, out=gain_envelope)
+    np.divide(processed_audio, gain_envelope, out=processed_audio)
 
-        # Find fundamental frequency
-        fund_bin = np.argmax(ps)
-        fund_indices = get_indices_around_peak(ps, fund_bin)
+    return processed_audio
 
-        # Calculate noise profile
-        noise_prepared = copy.copy(ps)
-        noise_prepared[fund_indices] = 0
-        noise_mean = np.median(noise_prepared[noise_prepared != 0])
 
-        # Calculate RMS for this chunk
-        chunk_rms = np.sqrt(np.mean(chunk**2))
+@lru_cache(maxsize=16)
+def _hann(n):
+    """Build a read-only Hann window of length n, cached across calls."""
+    window = np.hanning(n).astype(np.float32)
+    window.flags.writeable = False
+    return window
 
-        # Dynamic threshold based on noise floor
-        noise_floor = np.sqrt(noise_mean)
-        threshold = noise_floor * threshold_ratio
 
-        # Calculate gain
-        if chunk_rms > threshold:
-            gain = 1.0
-        else:
-            gain = (chunk_rms / threshold) ** 2
+@lru_cache(maxsize=16)
+def _kaiser(n, beta):
+    """Build a read-only periodic Kaiser window, as signal.periodogram uses."""
+    window = signal.windows.kaiser(n, beta, sym=False).astype(np.float32)
+    window.flags.writeable = False
+    return window
 
-        # Apply gain to chunk
-        processed_chunk = chunk * gain
 
-        # Add to output with overlap-add
-        start_idx = i * hop_size
-        end_idx = start_idx + chunk_size
-        processed_audio[start_idx:end_idx] += processed_chunk * np.hanning(chunk_size)
-        gain_envelope[start_idx:end_idx] += np.hanning(chunk_size)
+@njit(cache=True)
+def _peak_bounds(ps, peak_bins, search_width=1000):
+    """Get the bin range around the peak of every column of a spectrum.
 
-    # Normalize for overlap-add
-    processed_audio = processed_audio / np.maximum(gain_envelope, 1e-8)
+    Args:
+        ps: (n_freq, n_frames) array to search
+        peak_bins: peak index of each column
+        search_width: how far to search around peak
 
-    return processed_audio
+    Returns:
+        tuple: (lo, hi) arrays with the inclusive bounds of each peak
+    """
+    n_frames = ps.shape[1]
+    lo = np.empty(n_frames, dtype=np.int64)
+    hi = np.empty(n_frames, dtype=np.int64)
+
+    for j in range(n_frames):
+        lo[j], hi[j] = _peak_range(ps[:, j], peak_bins[j], search_width)
+
+    return lo, hi
+
+
+@njit(cache=True, nogil=True)
+def _peak_range(arr, peak_index, search_width=1000):
+    """Get the inclusive bounds of the range around a peak in an array.
+
+    From the peak the range extends in both directions for as long as the
+    values do not rise.
+
+    Args:
+        arr: array to search
+        peak_index: index of peak
+        search_width: how far to search around peak
+
+    Returns:
+        tuple: (lo, hi) bounds of the peak
+    """
+    n = len(arr)
+
+    hi = peak_index
+    cur_val = arr[peak_index]
+    while (hi + 1 < n and hi + 1 - peak_index < search_width
+           and arr[hi + 1] <= cur_val):
+        hi += 1
+        cur_val = arr[hi]
+
+    lo = peak_index
+    cur_val = arr[peak_index]
+    while (lo > 0 and peak_index - lo + 1 < search_width
+           and arr[lo - 1] <= cur_val):
+        lo -= 1
+        cur_val = arr[lo]
+
+    return lo, hi
 
 
+@njit(cache=True, nogil=True)
 def get_indices_around_peak(arr, peak_index, search_width=1000):
     """Get indices around a peak in an array.
 
@@ -98,34 +217,8 @@ def get_indices_around_peak(arr, peak_index, search_width=1000):
     Returns:
         array of indices around peak
     """
-    peak_bins = []
-    mag_max = arr[peak_index]
-    cur_val = mag_max
-
-    for i in range(search_width):
-        new_bin = peak_index + i
-        if new_bin >= len(arr):
-            break
-        new_val = arr[new_bin]
-        if new_val > cur_val:
-            break
-        else:
-            peak_bins.append(int(new_bin))
-            cur_val = new_val
-
-    cur_val = mag_max
-    for i in range(search_width):
-        new_bin = peak_index - i
-        if new_bin < 0:
-            break
-        new_val = arr[new_bin]
-        if new_val > cur_val:
-            break
-        else:
-            peak_bins.append(int(new_bin))
-            cur_val = new_val
-
-    return array(list(set(peak_bins)))
+    lo, hi = _peak_range(arr, peak_index, search_width)
+    return np.arange(lo, hi + 1)
 
 
 def process_file(input_file):
@@ -137,8 +230,10 @@ def process_file(input_file):
     Returns:
         tuple: (processed_audio, sample_rate)
     """
-    # Load audio
-    audio, sr = librosa.load(input_file, sr=None)
+    # Load audio as mono float32 at its native sample rate
+    audio, sr = sf.read(input_file, dtype='float32')
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
 
     # Apply noise reduction
     processed_audio = dynamic_noise_reduction(
@@ -5,9 +5,9 @@ Date: 11.11.2024
 """
 
 import os
-import librosa
 import soundfile as sf
 import numpy as np
+from scipy.signal import lfilter
 
 
 def preemphasis(input_file):
@@ -19,13 +19,31 @@ def preemphasis(input_file):
     Returns:
         tuple: Pre-emphasized audio signal and sample rate
     """
-    # Load audio
-    audio, sr = librosa.load(input_file)
+    # Load audio as mono float32 at its native sample rate
+    audio, sr = sf.read(input_file, dtype='float32')
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
 
-    # Apply pre-emphasis with coefficient 0.60
-    pre_emphasized = librosa.effects.preemphasis(audio, coef=0.60)
+    return apply_preemphasis(audio), sr
+
+
+def apply_preemphasis(audio):
+    """Apply pre-emphasis filter to speech audio.
+    
+    Args:
+        audio: Input audio signal
+        
+    Returns:
+        np.array: Pre-emphasized audio signal
+    """
+    # Apply pre-emphasis with coefficient 0.60, initialized by linear
+    # extrapolation of the first samples
+    b = np.array([1.0, -0.60], dtype=audio.dtype)
+    a = np.array([1.0], dtype=audio.dtype)
+    zi = 2 * audio[0:1] - audio[1:2]
+    pre_emphasized, _ = lfilter(b, a, audio, zi=zi)
     
-    return pre_emphasized, sr
+    return pre_emphasized
 
 
 if __name__ == "__main__":
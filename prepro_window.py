@@ -6,8 +6,8 @@ Date: 11.11.2024
 
 import os
 import warnings
+from functools import lru_cache
 
-import librosa
 import numpy as np
 from scipy import signal
 import soundfile as sf
@@ -15,24 +15,17 @@ import soundfile as sf
 warnings.filterwarnings("ignore")
 
 
-def process_with_ola(audio, window_size, hop_length, window_type='hamming'):
-    """Process audio using overlap-add method.
+@lru_cache(maxsize=16)
+def _get_window(window_type, window_size):
+    """Build a read-only window, cached across calls.
 
     Args:
-        audio (np.array): Input audio signal
-        window_size (int): Size of window in samples
-        hop_length (int): Number of samples between windows
         window_type (str): Type of window ('hamming', 'hann', or 'triang')
+        window_size (int): Size of window in samples
 
     Returns:
-        np.array: Processed audio signal
+        np.array: Window function as float32
     """
-    # Initialize output array
-    output = np.zeros(len(audio))
-    # Initialize normalization array
-    norm = np.zeros(len(audio))
-
-    # Get window function
     if window_type == 'hann':
         window = signal.windows.hann(window_size)
     elif window_type == 'hamming':
@@ -40,24 +33,62 @@ def process_with_ola(audio, window_size, hop_length, window_type='hamming'):
     else:
         window = signal.windows.triang(window_size)
 
-    # Process each frame
-    for i in range(0, len(audio) - window_size, hop_length):
-        # Extract frame
-        frame = audio[i:i+window_size]
-        if len(frame) < window_size:
-            break
+    window = window.astype(np.float32)
+    window.flags.writeable = False
+    return window
+
 
-        # Apply window
-        windowed_frame = frame * window
+def process_with_ola(audio, window_size, hop_length, window_type='hamming'):
+    """Process audio using overlap-add method.
+
+    Args:
+        audio (np.array): Input audio signal
+        window_size (int): Size of window in samples
+        hop_length (int): Number of samples between windows
+        window_type (str): Type of window ('hamming', 'hann', or 'triang')
 
-        # Add to output (overlap-add)
-        output[i:i+window_size] += windowed_frame
-        # Add window weights for normalization
-        norm[i:i+window_size] += window
+    Returns:
+        np.array: Processed audio signal
+    """
+    # Initialize output array
+    output = np.zeros(len(audio), dtype=np.float32)
+    # Initialize normalization array
+    norm = np.zeros(len(audio), dtype=np.float32)
 
-    # Normalize
-    mask = norm > 1e-10
-    output[mask] /= norm[mask]
+    # Get window function
+    window = _get_window(window_type, window_size)
+
+    # Extract all full frames and apply window
+    n_frames = len(range(0, len(audio) - window_size, hop_length))
+    if n_frames == 0:
+        return output
+    frames = np.lib.stride_tricks.sliding_window_view(
+        audio, window_size)[::hop_length][:n_frames] * window
+
+    # Split frames into hop-sized segments, so that segment j of frame i
+    # lands on output block i + j
+    n_segments = -(-window_size // hop_length)
+    pad = n_segments * hop_length - window_size
+    segments = np.pad(frames, ((0, 0), (0, pad))).reshape(
+        n_frames, n_segments, hop_length)
+    window_segments = np.pad(window, (0, pad)).reshape(n_segments, hop_length)
+
+    # Add to output (overlap-add) with window weights for normalization
+    blocks = np.zeros((n_frames + n_segments - 1, hop_length),
+                      dtype=np.float32)
+    norm_blocks = np.zeros_like(blocks)
+    for j in range(n_segments):
+        blocks[j:j + n_frames] += segments[:, j]
+        norm_blocks[j:j + n_frames] += window_segments[j]
+
+    n = min(len(audio), blocks.size)
+    output[:n] = blocks.ravel()[:n]
+    norm[:n] = norm_blocks.ravel()[:n]
+
+    # Normalize; uncovered samples are zero in output, so clamping the
+    # weights leaves them unchanged
+    np.maximum(norm, 1e-10, out=norm)
+    np.divide(output, norm, out=output)
 
     return output
 
@@ -71,24 +102,36 @@ def apply_windowing(input_file):
     Returns:
         tuple: Processed audio signal and sample rate
     """
-    # Load full audio
-    audio, sr = librosa.load(input_file)
+    # Load audio as mono float32 at its native sample rate
+    audio, sr = sf.read(input_file, dtype='float32')
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+
+    return apply_hamming_window(audio), sr
 
+
+def apply_hamming_window(audio):
+    """Apply Hamming windowing with fixed window size of 512 to audio.
+
+    Args:
+        audio (np.array): Input audio signal
+        
+    Returns:
+        np.array: Processed audio signal
+    """
     # Fixed configuration
     window_size = 512
     hop_length = window_size // 4  # 75% overlap
     window_type = 'hamming'
 
     # Process audio
-    processed = process_with_ola(
+    return process_with_ola(
         audio,
         window_size=window_size,
         hop_length=hop_length,
         window_type=window_type
     )
 
-    return processed, sr
-
 
 if __name__ == "__main__":
     # Setup paths
@@ -9,17 +9,16 @@ Date: 11.11.2024
 
 import os
 import glob
-import librosa
 import soundfile as sf
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Tuple, List
+from typing import Tuple, List, Optional
 
 # Import all preprocessing components
 from .prepro_noisegate_equalizer import dynamic_noise_reduction
-from .prepro_bandpass import apply_bandpass_filter 
-from .prepro_preemphasis import apply_preemphasis
-from .prepro_window import apply_windowing
+from .prepro_bandpass import bandpass_and_preemphasize
+from .prepro_window import apply_hamming_window
 from .prepro_audioseparator import separate_audio
 
 
@@ -48,25 +47,24 @@ def process_single_file(wav_file: Path, output_path: Path) -> bool:
     logger = logging.getLogger(__name__)
     
     try:
-        # Load audio
-        audio, sr = librosa.load(str(wav_file), sr=None)
-        
-        # 1. Separate vocals from background
-        vocals, _ = separate_audio(audio, sr)
+        # 1. Separate vocals from background, audio-separator reads the
+        # input file itself so only the vocals stem is loaded here
+        separated_dir = output_path.parent / 'separated'
+        (vocals_file,), _ = separate_audio(str(wav_file), str(separated_dir))
+        vocals, sr = sf.read(vocals_file, dtype='float32')
+        if vocals.ndim > 1:
+            vocals = vocals.mean(axis=1)
         
         # 2. Apply noise reduction
         audio_denoised = dynamic_noise_reduction(vocals, sr)
         
-        # 3. Apply bandpass filter
-        audio_filtered = apply_bandpass_filter(audio_denoised, sr)
-        
-        # 4. Apply pre-emphasis
-        audio_emphasized = apply_preemphasis(audio_filtered)
+        # 3. and 4. Apply bandpass filter and pre-emphasis in one cascade
+        audio_emphasized = bandpass_and_preemphasize(audio_denoised, sr)
         
         # 5. Apply windowing
-        audio_windowed = apply_windowing(audio_emphasized)
+        audio_windowed = apply_hamming_window(audio_emphasized)
         
-        # Save processed audio
+        # Save processed audio, the only write of the pipeline
         sf.write(str(output_path), audio_windowed, sr)
         
         return True
@@ -76,12 +74,31 @@ def process_single_file(wav_file: Path, output_path: Path) -> bool:
         return False
 
 
-def process_audio_files(input_dir: str, output_dir: str) -> None:
+def _process_worker(wav_file: Path, output_file: Path) -> Tuple[Path, bool]:
+    """Process one file in a worker process.
+    
+    Args:
+        wav_file: Path to input wav file
+        output_file: Path to save processed file
+        
+    Returns:
+        tuple: The input path and whether processing was successful
+    """
+    logging.getLogger(__name__).info(f"Processing {wav_file}...")
+    return wav_file, process_single_file(wav_file, output_file)
+
+
+def process_audio_files(input_dir: str, output_dir: str,
+                        max_workers: Optional[int] = None) -> None:
     """Process multiple audio files through preprocessing pipeline.
     
+    Files are independent of each other and are processed in parallel.
+    
     Args:
         input_dir: Directory containing input .wav files
         output_dir: Directory to save processed files
+        max_workers: Number of worker processes, defaults to half the
+            available cores
         
     Raises:
         FileNotFoundError: If input directory doesn't exist
@@ -104,19 +121,29 @@ def process_audio_files(input_dir: str, output_dir: str) -> None:
     # Get list of first 5 IS*.wav files
     wav_files = sorted(list(input_path.glob("IS0*.wav")))[:5]
     
+    output_files = {}
     for wav_file in wav_files:
-        logger.info(f"Processing {wav_file}...")
-        
         # Get filename without path and extension
         base_name = '_'.join(wav_file.stem.split('_')[:2])  # Take first two parts of name
         cleaned_name = f"{base_name}_cleaned.wav"
-        output_file = output_path / cleaned_name
+        output_files[wav_file] = output_path / cleaned_name
+    
+    if max_workers is None:
+        max_workers = max(1, (os.cpu_count() or 1) // 2)
+    
+    # Workers log the same way as the parent; under the spawn start method
+    # they would otherwise start without handlers
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             initializer=setup_logging) as executor:
+        results = executor.map(_process_worker, wav_files,
+                               [output_files[f] for f in wav_files])
         
-        if process_single_file(wav_file, output_file):
-            logger.info(f"Successfully processed {wav_file}")
-            logger.info(f"Saved cleaned file to: {output_file}")
-        else:
-            logger.error(f"Failed to process {wav_file}")
+        for wav_file, success in results:
+            if success:
+                logger.info(f"Successfully processed {wav_file}")
+                logger.info(f"Saved cleaned file to: {output_files[wav_file]}")
+            else:
+                logger.error(f"Failed to process {wav_file}")
 
 
 def main() -> None: